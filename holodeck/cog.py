@@ -1,8 +1,19 @@
 import asyncio
-import datetime
+import bisect
+import concurrent.futures
+import contextlib
+import dataclasses
+import dbm
+import io
+import itertools
+import json
 import logging
 import os
-import shelve
+import pickle
+import re
+import sys
+import threading
+import uuid
 from contextlib import asynccontextmanager
 
 import discord
@@ -16,7 +27,86 @@ from .scene import Scene
 _log = logging.getLogger(__name__)
 
 
+SCENES_LOCATION = "data/scenes.json"
+# Scenes used to be stored in a shelve, we migrate them on first load.
 SHELVE_LOCATION = "data/scenes.shelve"
+# Scenes to create at startup if we don't have them yet.
+PRE_WARM_LOCATION = "data/pre_warm.json"
+# Matches the default runtime of add_scene.
+PRE_WARM_RUNTIME_MILLIS = 10_000
+# Discord won't show more autocomplete results than this.
+MAX_AUTOCOMPLETE_CHOICES = 25
+# How long to stay in voice after a banish, in case another one follows.
+VOICE_IDLE_TIMEOUT_SECONDS = 5 * 60
+
+MAX_CONCURRENT_DOWNLOADS = 2
+# Downloads get their own threads so a burst of them can't starve the default
+# executor that discord.py also uses. Its size is also what caps concurrent
+# downloads, further ones queue for a free thread.
+DOWNLOAD_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="ytdl"
+)
+# A single worker runs saves one at a time, in the order they were made.
+PERSIST_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="persist"
+)
+# Saves are batched: after a change we wait this long for more before saving.
+SAVE_DELAY_SECONDS = 2
+
+
+YOUTUBE_DL_LOCATION = "data/youtubedl"
+# Cheap sanity check for add_scene, before we commit to a download.
+YOUTUBE_URL_PATTERN = re.compile(r"^https?://([\w-]+\.)?(youtube\.com|youtu\.be)/")
+
+os.makedirs(YOUTUBE_DL_LOCATION, exist_ok=True)
+
+youtube_dl.utils.bug_reports_message = lambda: ""
+
+ytdl_format_options = {
+    "format": "bestaudio/best",
+    # do the conversion using sox
+    #'postprocessors': [{
+    #'key': 'FFmpegExtractAudio',
+    #'preferredcodec': 'mp3',
+    #'preferredquality': '192',
+    # }],
+    "outtmpl": f"{YOUTUBE_DL_LOCATION}/%(extractor)s-%(id)s-%(title)s.%(ext)s",
+    "restrictfilenames": True,
+    "noplaylist": True,
+    "nocheckcertificate": True,
+    "ignoreerrors": False,
+    "logtostderr": False,
+    "quiet": False,
+    "no_warnings": False,
+    "default_search": "auto",
+    "source_address": "0.0.0.0",  # bind to ipv4 since ipv6 addresses cause issues sometimes
+}
+
+OPUS_LOCATION = "data/opus"
+OPUS_EXTENSION = ".opus"
+# Files from encode_scene_audio are already Opus, so playback copies the stream.
+# FFmpegOpusAudio maps "opus" to a stream copy on every discord.py 2.x, while
+# "copy" is only understood from 2.4 on.
+OPUS_PASSTHROUGH_CODEC = "opus"
+
+os.makedirs(OPUS_LOCATION, exist_ok=True)
+
+# YoutubeDL keeps per-download state and isn't thread safe, so each download
+# thread gets its own, built on first use and then reused.
+_thread_local = threading.local()
+
+
+def _thread_ytdl() -> youtube_dl.YoutubeDL:
+    ytdl = getattr(_thread_local, "ytdl", None)
+    if ytdl is None:
+        ytdl = _thread_local.ytdl = youtube_dl.YoutubeDL(ytdl_format_options)
+    return ytdl
+
+
+# Importing the extractors and compiling their url patterns is shared by every
+# instance, so pay for it now, including faulting in the lazily loaded youtube
+# extractor, rather than on the first add_scene.
+youtube_dl.YoutubeDL(ytdl_format_options).get_info_extractor("Youtube")
 
 
 async def do_youtube_dl(url: str, loop: asyncio.BaseEventLoop) -> tuple[str, int]:
@@ -28,63 +118,326 @@ async def do_youtube_dl(url: str, loop: asyncio.BaseEventLoop) -> tuple[str, int
     Returns:
         A tuple[str, int] of the absoloute path, duration_millis respectively.
     """
-    os.makedirs("data/youtubedl", exist_ok=True)
-
-    youtube_dl.utils.bug_reports_message = lambda: ""
-
-    ytdl_format_options = {
-        "format": "bestaudio/best",
-        # do the conversion using sox
-        #'postprocessors': [{
-        #'key': 'FFmpegExtractAudio',
-        #'preferredcodec': 'mp3',
-        #'preferredquality': '192',
-        # }],
-        "outtmpl": "data/youtubedl/%(extractor)s-%(id)s-%(title)s.%(ext)s",
-        "restrictfilenames": True,
-        "noplaylist": True,
-        "nocheckcertificate": True,
-        "ignoreerrors": False,
-        "logtostderr": False,
-        "quiet": False,
-        "no_warnings": False,
-        "default_search": "auto",
-        "source_address": "0.0.0.0",  # bind to ipv4 since ipv6 addresses cause issues sometimes
-    }
-
-    ytdl = youtube_dl.YoutubeDL(ytdl_format_options)
-
     _log.info("Downloading song from youtube: %s", url)
 
     def do_download():
-        res = ytdl.extract_info(url, download=True)
-        return res
+        ytdl = _thread_ytdl()
+        # We only read a couple of fields, so skip sanitize_info, which copies
+        # the whole (potentially huge) info dict.
+        data = ytdl.extract_info(url, download=True)
+        if "entries" in data:
+            # take first item from a playlist
+            data = data["entries"][0]
+
+        filename = ytdl.prepare_filename(data)
+        # labeled_format = filename.rsplit('.', 1)[-1]
+        # if labeled_format not in ('mp3', 'webm', 'm4a'):
+        return (filename, data["duration"])
+
+    filename, duration = await loop.run_in_executor(DOWNLOAD_POOL, do_download)
+    return (os.path.relpath(filename), duration * 1000)
+
 
-    data = ytdl.sanitize_info(await loop.run_in_executor(None, do_download))
-    if "entries" in data:
-        # take first item from a playlist
-        data = data["entries"][0]
+def ffmpeg_seek_options(start_millis: int | None, runtime_millis: int | None) -> str:
+    """Build the ffmpeg input options to seek to start and limit the duration."""
+    # These belong in before_options so ffmpeg seeks to start_time and doesn't
+    # read beyond duration. If we instead used options, it would process the
+    # whole file but drop the unecessary audio on output.
+    ffmpeg_options = ""
+    if start_millis is not None and start_millis > 0:
+        # ffmpeg takes plain seconds, no need to format a timestamp.
+        ffmpeg_options += f" -ss {start_millis / 1000:.3f}"
 
-    filename = ytdl.prepare_filename(data)
-    # labeled_format = filename.rsplit('.', 1)[-1]
-    # if labeled_format not in ('mp3', 'webm', 'm4a'):
+    if runtime_millis is not None:
+        # Note: ffmpeg doesn't do end_time, instead it uses duration, time after start.
+        ffmpeg_options += f" -t {runtime_millis / 1000:.3f}"
+    return ffmpeg_options
 
-    return (os.path.relpath(filename), data["duration"] * 1000)
+
+async def encode_scene_audio(path: str, start_millis: int, runtime_millis: int) -> str:
+    """Trim, normalize and encode a downloaded file to Opus.
+
+    Doing this once when the scene is created means playback can pass the
+    Opus stream straight through instead of re-encoding it every banish.
+
+    Every call writes a new file, so we never write over audio that another
+    scene may be playing.
+
+    Returns:
+        The relative path of the encoded file.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(OPUS_LOCATION, f"{stem}-{uuid.uuid4().hex}{OPUS_EXTENSION}")
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-n",
+        "-loglevel",
+        "warning",
+        *ffmpeg_seek_options(start_millis, runtime_millis).split(),
+        "-i",
+        path,
+        "-filter:a",
+        "loudnorm",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        "96k",
+        "-ar",
+        "48000",
+        "-ac",
+        "2",
+        out_path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        remove_files([out_path])
+        raise RuntimeError(f"ffmpeg failed to encode {path}: {stderr.decode()}")
+    return out_path
+
+
+def remove_files(paths: list[str]):
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+async def probe_duration_millis(path: str) -> int:
+    """Read the duration of a local media file with ffprobe."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffprobe failed to read {path}: {stderr.decode()}")
+    try:
+        return int(float(stdout) * 1000)
+    except ValueError:
+        # ffprobe succeeds but prints N/A for files without a known duration.
+        raise RuntimeError(
+            f"ffprobe found no duration for {path}: {stdout.decode().strip()}"
+        ) from None
+
+
+class _LegacyScene:
+    """Stand-in class for unpickling scenes from the old shelve."""
+
+
+class _LegacySceneUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) == ("holodeck.scene", "Scene"):
+            return _LegacyScene
+        return super().find_class(module, name)
+
+
+def _load_shelve_scenes() -> dict[str, Scene]:
+    try:
+        db = dbm.open(SHELVE_LOCATION, "r")
+    except dbm.error:
+        return {}
+    with db:
+        return {
+            key.decode(): _scene_from_dict(
+                vars(_LegacySceneUnpickler(io.BytesIO(db[key])).load())
+            )
+            for key in db.keys()
+        }
+
+
+def _scene_from_dict(d: dict) -> Scene:
+    # Names are used as keys everywhere, so share one copy of each.
+    d["name"] = sys.intern(d["name"])
+    if "source_path" not in d and not d["audio_path"].endswith(OPUS_EXTENSION):
+        # Raw downloads from before we encoded at ingest are their own source.
+        d["source_path"] = d["audio_path"]
+    if "ffmpeg_before_options" not in d:
+        # Saved before the ffmpeg options were stored on the scene.
+        d["ffmpeg_before_options"] = ffmpeg_seek_options(
+            d["start_time_millis"], d["runtime_millis"]
+        )
+        if d["audio_path"].endswith(OPUS_EXTENSION):
+            d["ffmpeg_codec"] = OPUS_PASSTHROUGH_CODEC
+        else:
+            # A raw download from before we encoded at ingest.
+            d["ffmpeg_options"] = "-filter:a loudnorm"
+    elif d.get("ffmpeg_codec") == "copy":
+        # Older discord.py re-encodes on "copy", use the name every version copies.
+        d["ffmpeg_codec"] = OPUS_PASSTHROUGH_CODEC
+    return Scene(**d)
+
+
+def load_scenes() -> dict[str, Scene]:
+    """Load every saved scene, keyed by name."""
+    try:
+        with open(SCENES_LOCATION) as f:
+            scenes = [_scene_from_dict(d) for d in json.load(f).values()]
+            return {scene.name: scene for scene in scenes}
+    except FileNotFoundError:
+        pass
+    scenes = _load_shelve_scenes()
+    if scenes:
+        _log.info("Migrating %d scenes from %s", len(scenes), SHELVE_LOCATION)
+        save_scenes({name: dataclasses.asdict(s) for name, s in scenes.items()})
+    return scenes
+
+
+def save_scenes(scenes: dict[str, dict], orphaned_audio: list[str] | None = None):
+    """Atomically replace the saved scenes with the given ones.
+
+    Args:
+        scenes: Every scene, as dicts keyed by name.
+        orphaned_audio: Encoded audio no scene uses anymore, removed once the
+            saved scenes no longer point at it.
+    """
+    tmp_location = SCENES_LOCATION + ".tmp"
+    with open(tmp_location, "w") as f:
+        json.dump(scenes, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_location, SCENES_LOCATION)
+    if orphaned_audio:
+        remove_files(orphaned_audio)
 
 
 class HolodeckCog(discord.ext.commands.Cog):
     def __init__(self, bot: racket.RacketBot):
         self.bot = bot
-        with shelve.open(SHELVE_LOCATION) as s:
-            scene_cache = dict(s)
-        self._scene_cache = scene_cache
-        # TODO: Make a mapping from guild.id to lock.
-        self._lock = asyncio.Lock()
+        self._scene_cache = load_scenes()
+        # (lowercased name, name) for every scene, sorted, so autocomplete can
+        # bisect for prefix matches without lowercasing names per keystroke.
+        self._lower_index: list[tuple[str, str]] = sorted(
+            (name.lower(), name) for name in self._scene_cache
+        )
+        # Choices shown before anything is typed, built lazily.
+        self._default_choices: list[discord.app_commands.Choice[str]] | None = None
+        # Downloads we already have on disk, so scenes sharing a video don't
+        # download it again.
+        self._url_to_source: dict[str, str] = {
+            s.audio_url: s.source_path
+            for s in self._scene_cache.values()
+            if s.audio_url and s.source_path
+        }
+        self._source_durations: dict[str, int] = {}
+        # Downloads in progress, so concurrent requests for a url share one.
+        self._inflight: dict[str, asyncio.Task[tuple[str, int]]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        # Voice connections are slow to set up, so we stay connected after a
+        # banish and only disconnect once the guild has sat idle.
+        self._idle_disconnects: dict[int, asyncio.Task] = {}
+        # Hold references to fire-and-forget tasks so they aren't collected
+        # before they finish.
+        self._background_tasks: set[asyncio.Task] = set()
+        # Set when _scene_cache has changes that haven't been saved yet.
+        self._dirty = asyncio.Event()
+        self._save_task: asyncio.Task | None = None
+        # Encoded audio of replaced scenes, deleted by the next save.
+        self._orphaned_audio: list[str] = []
+
+    async def cog_load(self):
+        self._save_task = asyncio.create_task(self._save_loop())
+        prewarm = asyncio.create_task(self._prewarm())
+        self._background_tasks.add(prewarm)
+        prewarm.add_done_callback(self._background_tasks.discard)
+
+    async def cog_unload(self):
+        # Stop anything that could still call write_scene, so nothing changes
+        # after the final save below.
+        tasks = [*self._background_tasks, *self._inflight.values()]
+        if self._save_task is not None:
+            tasks.append(self._save_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for idle_disconnect in self._idle_disconnects.values():
+            idle_disconnect.cancel()
+        self._idle_disconnects.clear()
+        for voice_client in self.bot.voice_clients:
+            await voice_client.disconnect(force=True)
+        if self._dirty.is_set():
+            # Go through the pool so this can't overlap a save in progress.
+            PERSIST_POOL.submit(
+                save_scenes, self._snapshot(), self._orphaned_audio
+            ).result()
+
+    def _lock_for(self, guild_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(guild_id, asyncio.Lock())
+
+    async def _connect(self, channel: discord.VoiceChannel) -> discord.VoiceClient:
+        guild = channel.guild
+        idle_disconnect = self._idle_disconnects.pop(guild.id, None)
+        if idle_disconnect is not None:
+            idle_disconnect.cancel()
+        # discord.py tracks the guild's connection, so ask it rather than
+        # keeping our own copy that can go stale.
+        voice_client = guild.voice_client
+        if voice_client is not None and not voice_client.is_connected():
+            # Stuck mid-reconnect, start over with a fresh connection.
+            await voice_client.disconnect(force=True)
+            voice_client = None
+        if voice_client is None:
+            voice_client = await channel.connect()
+        elif voice_client.channel != channel:
+            await voice_client.move_to(channel)
+        return voice_client
+
+    def _disconnect_when_idle(self, guild: discord.Guild):
+        async def disconnect():
+            await asyncio.sleep(VOICE_IDLE_TIMEOUT_SECONDS)
+            async with self._lock_for(guild.id):
+                self._idle_disconnects.pop(guild.id, None)
+                if guild.voice_client is not None:
+                    await guild.voice_client.disconnect()
+
+        self._idle_disconnects[guild.id] = asyncio.create_task(disconnect())
+
+    def _snapshot(self) -> dict[str, dict]:
+        return {name: dataclasses.asdict(s) for name, s in self._scene_cache.items()}
+
+    async def _save_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(SAVE_DELAY_SECONDS)
+            self._dirty.clear()
+            orphaned_audio, self._orphaned_audio = self._orphaned_audio, []
+            # Keep the file I/O off the event loop so it can't stall the heartbeat.
+            try:
+                await self.bot.loop.run_in_executor(
+                    PERSIST_POOL, save_scenes, self._snapshot(), orphaned_audio
+                )
+            except Exception:
+                # Keep the loop alive, otherwise nothing is saved until unload.
+                _log.exception("Failed to save scenes, will retry")
+                self._orphaned_audio += orphaned_audio
+                self._dirty.set()
 
     def write_scene(self, scene: Scene):
-        with shelve.open(SHELVE_LOCATION) as s:
-            s[scene.name] = scene
+        """Add or replace a scene. It is saved to disk shortly after."""
+        old = self._scene_cache.get(scene.name)
+        if old is None:
+            bisect.insort(self._lower_index, (scene.name.lower(), scene.name))
+            self._default_choices = None
         self._scene_cache[scene.name] = scene
+        if (
+            old is not None
+            and os.path.dirname(old.audio_path) == OPUS_LOCATION
+            and not any(
+                s.audio_path == old.audio_path for s in self._scene_cache.values()
+            )
+        ):
+            self._orphaned_audio.append(old.audio_path)
+        if scene.audio_url and scene.source_path:
+            self._url_to_source[scene.audio_url] = scene.source_path
+        self._dirty.set()
 
     @discord.app_commands.command()
     async def add_scene(
@@ -107,9 +460,14 @@ class HolodeckCog(discord.ext.commands.Cog):
             start_time_seconds: The start time you want for your audio.
             overwrite: Set this true if you're overwriting an existing scene.
         """
+        if not YOUTUBE_URL_PATTERN.match(youtube_url):
+            await interaction.response.send_message(
+                f"`{youtube_url}` doesn't look like a youtube URL.", ephemeral=True
+            )
+            return
         # Note: There's a slight race condition here. Technically some one else
-        # can snipe the scene name during yt download below. Not likely, and
-        # probably fine if it happens.
+        # can snipe the scene name while the audio is fetched in the
+        # background. Not likely, and probably fine if it happens.
         if name in self._scene_cache and not overwrite:
             await interaction.response.send_message(
                 f"A scene with the name {name} already exists. "
@@ -118,64 +476,230 @@ class HolodeckCog(discord.ext.commands.Cog):
             )
             return
         await interaction.response.defer()
-        try:
-            path, duration_millis = await do_youtube_dl(youtube_url, self.bot.loop)
-        except IndexError:
-            await interaction.edit_original_response(
-                content=f"Failed to download youtube video. Are you sure this is the right URL? `{youtube_url}`"
+        await interaction.edit_original_response(
+            content=f"Downloading audio for the scene `{name}`..."
+        )
+        task = asyncio.create_task(
+            self._download_and_register(
+                interaction,
+                name=name,
+                youtube_url=youtube_url,
+                image_url=image_url,
+                runtime_millis=int(runtime_seconds * 1000),
+                start_time_millis=int(start_time_seconds * 1000),
             )
-            return
-        runtime_millis = int(runtime_seconds * 1000)
-        start_time_millis = int(start_time_seconds * 1000)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _fetch_source(self, url: str) -> tuple[str, int]:
+        """Get the full audio for a url, downloading it only if we don't have it.
+
+        Returns:
+            A tuple[str, int] of the path, duration_millis respectively.
+        """
+        path = self._url_to_source.get(url)
+        if path is not None and os.path.exists(path):
+            duration_millis = self._source_durations.get(path)
+            if duration_millis is None:
+                try:
+                    duration_millis = await probe_duration_millis(path)
+                except RuntimeError:
+                    _log.exception("Failed to probe %s, downloading it again", path)
+            if duration_millis is not None:
+                self._source_durations[path] = duration_millis
+                return (path, duration_millis)
+        return await self._shared_download(url)
+
+    async def _shared_download(self, url: str) -> tuple[str, int]:
+        """Download a url, joining a download of it that's already running."""
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._download(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        # Shield so one requester giving up doesn't cancel it for the others.
+        return await asyncio.shield(task)
+
+    async def _download(self, url: str) -> tuple[str, int]:
+        path, duration_millis = await do_youtube_dl(url, self.bot.loop)
+        self._url_to_source[url] = path
+        self._source_durations[path] = duration_millis
+        return (path, duration_millis)
+
+    async def _create_scene(
+        self,
+        name: str,
+        creator: int,
+        youtube_url: str,
+        image_url: str,
+        runtime_millis: int,
+        start_time_millis: int,
+        overwrite: bool = True,
+    ) -> Scene | None:
+        """Fetch and encode the audio for a scene, then save it.
+
+        Returns:
+            The new scene, or None if overwrite is False and a scene with
+            this name was created while we were fetching the audio.
+
+        Raises:
+            IndexError, youtube_dl.utils.DownloadError: The download failed.
+            RuntimeError: Encoding the audio failed.
+        """
+        path, duration_millis = await self._fetch_source(youtube_url)
+        runtime_millis = min(
+            30_000, runtime_millis, (duration_millis - start_time_millis)
+        )
+        opus_path = await encode_scene_audio(path, start_time_millis, runtime_millis)
         scene = Scene(
             name=name,
-            creator=interaction.user.id,
+            creator=creator,
             audio_url=youtube_url,
-            audio_path=path,
-            start_time_millis=start_time_millis,
-            runtime_millis=min(
-                30_000, runtime_millis, (duration_millis - start_time_millis)
-            ),
+            # The encoded file is already trimmed to the scene.
+            audio_path=opus_path,
+            start_time_millis=0,
+            runtime_millis=runtime_millis,
             # TODO: We can fetch the image_url from youtube as a default?
             image_url=image_url,
+            source_path=path,
+            ffmpeg_codec=OPUS_PASSTHROUGH_CODEC,
         )
+        if not overwrite and name in self._scene_cache:
+            remove_files([opus_path])
+            return None
         self.write_scene(scene)
-        await interaction.edit_original_response(content=f"Created the scene `{name}`.")
+        return scene
 
-    async def play_file(
+    async def _download_and_register(
         self,
-        voice_client: discord.VoiceClient,
-        path: str,
-        start_millis: int,
+        interaction: discord.Interaction,
+        name: str,
+        youtube_url: str,
+        image_url: str,
         runtime_millis: int,
+        start_time_millis: int,
     ):
-        ffmpeg_options = ""
-        if start_millis is not None and start_millis > 0:
-            ffmpeg_options += " -ss {}".format(
-                datetime.timedelta(milliseconds=start_millis)
-            )
+        """Download the audio for a scene and save it once it's ready.
 
-        if runtime_millis is not None:
-            # Note: ffmpeg doesn't do end_time, instead it uses duration, time after start.
-            ffmpeg_options += " -t {}".format(
-                datetime.timedelta(milliseconds=runtime_millis)
+        This runs in the background so add_scene can respond right away, and
+        reports the outcome by editing the original response.
+        """
+        try:
+            await self._create_scene(
+                name,
+                interaction.user.id,
+                youtube_url,
+                image_url,
+                runtime_millis,
+                start_time_millis,
             )
+        except (IndexError, youtube_dl.utils.DownloadError):
+            content = f"Failed to download youtube video. Are you sure this is the right URL? `{youtube_url}`"
+        except RuntimeError:
+            _log.exception("Failed to encode audio for scene %s", name)
+            content = f"Failed to process the audio for `{youtube_url}`."
+        except Exception:
+            # Nothing awaits this task, so this is the only place it gets logged.
+            _log.exception("Failed to create scene %s", name)
+            content = f"Something went wrong creating the scene `{name}`."
+        else:
+            content = f"Created the scene `{name}`."
+        try:
+            await interaction.edit_original_response(content=content)
+        except discord.HTTPException:
+            # The interaction token expires after 15 minutes, which a long
+            # wait for a download slot can outlast.
+            _log.warning("Failed to report result for scene %s", name, exc_info=True)
 
-        # Use FFmpegOpusAudio instead of FFmpegPCMAudio
-        # This is in case the file we are loading is already opus encoded, preventing double-encoding
-        # Consider trying to store audio files in Opus format to decrease load
+    async def _prewarm(self):
+        """Create the scenes listed in PRE_WARM_LOCATION that we don't have yet.
 
-        # Use before_options to seek to start_time and not read beyond duration
-        # if we instead just use options, it will process the whole file but
-        # drop the unecessary audio on output
+        The file holds a json list of [name, youtube_url, image_url] entries.
+        """
+        try:
+            with open(PRE_WARM_LOCATION) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError:
+            _log.exception("Failed to parse %s", PRE_WARM_LOCATION)
+            return
+        if not isinstance(entries, list):
+            _log.error("Expected a list in %s", PRE_WARM_LOCATION)
+            return
+        valid = []
+        for entry in entries:
+            if (
+                not isinstance(entry, list)
+                or len(entry) != 3
+                or not all(isinstance(field, str) for field in entry)
+            ):
+                _log.warning("Skipping malformed pre-warm entry: %r", entry)
+                continue
+            valid.append(entry)
+        missing = [entry for entry in valid if entry[0] not in self._scene_cache]
+        _log.info(
+            "Pre-warming %d of %d scenes from %s",
+            len(missing),
+            len(entries),
+            PRE_WARM_LOCATION,
+        )
+        await self.bot.wait_until_ready()
+        created = 0
+        # One at a time, so pre-warming leaves download slots for add_scene.
+        for i, (name, youtube_url, image_url) in enumerate(missing, start=1):
+            # Someone may have created it with add_scene in the meantime, and
+            # we never want to replace their scene.
+            if name in self._scene_cache:
+                continue
+            try:
+                scene = await self._create_scene(
+                    name,
+                    self.bot.user.id,
+                    youtube_url,
+                    image_url,
+                    runtime_millis=PRE_WARM_RUNTIME_MILLIS,
+                    start_time_millis=0,
+                    overwrite=False,
+                )
+            except Exception:
+                _log.exception("Failed to pre-warm scene %s", name)
+                continue
+            if scene is None:
+                continue
+            created += 1
+            _log.info("Pre-warmed scene %s (%d/%d)", name, i, len(missing))
+        _log.info("Pre-warmed %d of %d missing scenes", created, len(missing))
+
+    async def play_file(
+        self, voice_client: discord.VoiceClient, scene: Scene
+    ) -> asyncio.Event:
+        """Start playing a scene's audio.
+
+        Returns:
+            An event that is set once playback finishes.
+        """
         track = discord.FFmpegOpusAudio(
-            path, before_options=ffmpeg_options, options="-filter:a loudnorm"
+            scene.audio_path,
+            before_options=scene.ffmpeg_before_options,
+            options=scene.ffmpeg_options,
+            codec=scene.ffmpeg_codec,
         )
 
         if voice_client.is_playing():
             voice_client.stop()
 
-        voice_client.play(track)
+        done = asyncio.Event()
+
+        def after(error: Exception | None):
+            # Called from the audio player's thread.
+            if error is not None:
+                _log.error("Playback of %s failed: %s", scene.audio_path, error)
+            self.bot.loop.call_soon_threadsafe(done.set)
+
+        voice_client.play(track, after=after)
+        return done
 
     @asynccontextmanager
     async def move_user(self, user: discord.Member, dest: discord.VoiceChannel):
@@ -198,13 +722,31 @@ class HolodeckCog(discord.ext.commands.Cog):
     async def banish_location_autocomplete(
         self, interaction: discord.Interaction, partial_scene: str
     ) -> list[discord.app_commands.Choice[str]]:
-        res = [
-            discord.app_commands.Choice(name=name, value=name)
-            for name in self._scene_cache.keys()
-            if (partial_scene.lower() in name.lower())
-        ]
-        res.sort(key=lambda c: c.name)
-        return res
+        partial = partial_scene.lower()
+        if not partial:
+            if self._default_choices is None:
+                self._default_choices = [
+                    discord.app_commands.Choice(name=name, value=name)
+                    for _, name in self._lower_index[:MAX_AUTOCOMPLETE_CHOICES]
+                ]
+            return self._default_choices
+
+        # Prefix matches are a contiguous range of the sorted names.
+        lo = bisect.bisect_left(self._lower_index, (partial,))
+        hi = bisect.bisect_left(self._lower_index, (partial + "\U0010ffff",), lo)
+        hi = min(hi, lo + MAX_AUTOCOMPLETE_CHOICES)
+        names = [name for _, name in self._lower_index[lo:hi]]
+        if len(names) < MAX_AUTOCOMPLETE_CHOICES:
+            # Fill the rest with names that contain the text elsewhere.
+            names += itertools.islice(
+                (
+                    name
+                    for lower, name in self._lower_index
+                    if partial in lower and not lower.startswith(partial)
+                ),
+                MAX_AUTOCOMPLETE_CHOICES - len(names),
+            )
+        return [discord.app_commands.Choice(name=name, value=name) for name in names]
 
     @discord.app_commands.command()
     @discord.app_commands.autocomplete(where=banish_location_autocomplete)
@@ -242,27 +784,34 @@ class HolodeckCog(discord.ext.commands.Cog):
             )
             return
 
-        if self._lock.locked():
+        lock = self._lock_for(interaction.guild_id)
+        if lock.locked():
             await interaction.response.send_message(
                 content="The bot is busy at the moment. Please try again later.",
                 ephemeral=True,
             )
             return
 
-        async with self._lock:
-            voice_client = await dest_channel.connect()
-            async with self.move_user(who, dest_channel):
-                await self.play_file(
-                    voice_client,
-                    scene.audio_path,
-                    scene.start_time_millis,
-                    scene.runtime_millis,
-                )
-                e = discord.Embed(
-                    title="Begone!",
-                    description=f"{who.mention} you have been banished to `{scene.name}`",
-                )
-                e.set_image(url=scene.image_url)
-                await interaction.response.send_message(embed=e)
-                await asyncio.sleep(scene.runtime_millis / 1000)
-            await voice_client.disconnect()
+        async with lock:
+            try:
+                # Inside the try: _connect drops the pending idle disconnect, so
+                # one must be rescheduled even if connecting fails.
+                voice_client = await self._connect(dest_channel)
+                async with self.move_user(who, dest_channel):
+                    done = await self.play_file(voice_client, scene)
+                    e = discord.Embed(
+                        title="Begone!",
+                        description=f"{who.mention} you have been banished to `{scene.name}`",
+                    )
+                    e.set_image(url=scene.image_url)
+                    await interaction.response.send_message(embed=e)
+                    # Playback can end early if the audio is shorter than
+                    # expected or ffmpeg fails, so don't hold the lock longer.
+                    try:
+                        await asyncio.wait_for(
+                            done.wait(), timeout=scene.runtime_millis / 1000 + 1
+                        )
+                    except asyncio.TimeoutError:
+                        voice_client.stop()
+            finally:
+                self._disconnect_when_idle(interaction.guild)
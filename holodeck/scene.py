@@ -1,7 +1,7 @@
 import dataclasses
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True, frozen=True)
 class Scene:
     name: str
     creator: int
@@ -10,3 +10,10 @@ class Scene:
     start_time_millis: int
     runtime_millis: int
     image_url: str
+    # The full download audio_path was made from, if we still know it.
+    source_path: str | None = None
+    # Passed straight to discord.FFmpegOpusAudio when the scene is played.
+    ffmpeg_before_options: str = ""
+    ffmpeg_options: str = ""
+    # None lets discord.py re-encode to Opus, "opus" passes the stream through.
+    ffmpeg_codec: str | None = None